@@ -1,6 +1,5 @@
 import streamlit as st
-import random
-import time
+import numpy as np
 
 st.set_page_config(page_title="Digital Twin Simulator", layout="wide")
 
@@ -13,18 +12,50 @@ ACOUSTIC_LIMIT = 2.5        # Pascal
 TEMPERATURE_LIMIT = 65       # Celsius
 CURRENT_LIMIT = 7.5          # Ampere
 
-# --- Layout setup ---
-col1, col2, col3, col4 = st.columns(4)
+# --- Simulation ranges (vibration, acoustic, temperature, current) ---
+SIM_LOW = [0.1, 0.5, 30, 3.0]
+SIM_HIGH = [1.0, 4.0, 90, 9.0]
+SIM_BATCH = 512              # ticks generated per RNG call
 
-placeholder = st.empty()
 
-# --- Main Simulation Loop ---
-while True:
+def simulate_batch(rng):
+    """Generate SIM_BATCH ticks of readings at once, rounded like the dashboard shows them."""
+    buf = rng.uniform(SIM_LOW, SIM_HIGH, size=(SIM_BATCH, 4))
+    np.round(buf[:, :2], 2, out=buf[:, :2])
+    np.round(buf[:, 2], 1, out=buf[:, 2])
+    np.round(buf[:, 3], 2, out=buf[:, 3])
+    return buf.tolist()
+
+
+def next_reading():
+    """Pop one simulated tick, refilling the batch from the session RNG when exhausted."""
+    if "sim_rng" not in st.session_state:
+        st.session_state.sim_rng = np.random.default_rng()
+        st.session_state.sim_buf = []
+        st.session_state.sim_idx = 0
+    if st.session_state.sim_idx >= len(st.session_state.sim_buf):
+        st.session_state.sim_buf = simulate_batch(st.session_state.sim_rng)
+        st.session_state.sim_idx = 0
+    row = st.session_state.sim_buf[st.session_state.sim_idx]
+    st.session_state.sim_idx += 1
+    return row
+
+# --- Refresh driver ---
+# Newer Streamlit reruns only the fragment below; older versions fall back to
+# a page-level autorefresh instead of blocking the script thread.
+if hasattr(st, "fragment"):
+    refresh_fragment = st.fragment(run_every=1.0)
+else:
+    from streamlit_autorefresh import st_autorefresh
+    st_autorefresh(interval=1000, key="sensors")
+    refresh_fragment = lambda fn: fn
+
+
+# --- Sensor Simulation ---
+@refresh_fragment
+def render_sensors():
     # Simulate sensor readings
-    vibration = round(random.uniform(0.1, 1.0), 2)
-    acoustic = round(random.uniform(0.5, 4.0), 2)
-    temperature = round(random.uniform(30, 90), 1)
-    current = round(random.uniform(3.0, 9.0), 2)
+    vibration, acoustic, temperature, current = next_reading()
 
     # --- Determine condition ---
     status = "Normal"
@@ -35,9 +66,13 @@ while True:
         status = "Faulty"
 
     # --- Update dashboard ---
+    # Layout lives inside the fragment so only this subtree is redrawn
+    placeholder = st.empty()
     with placeholder.container():
         st.subheader("🔹 Live Sensor Readings")
 
+        col1, col2, col3, col4 = st.columns(4)
+
         col1.metric("Vibration (g)", vibration, delta=None)
         col2.metric("Acoustic (Pa)", acoustic, delta=None)
         col3.metric("Temperature (°C)", temperature, delta=None)
@@ -55,5 +90,6 @@ while True:
         st.progress(min((current / CURRENT_LIMIT), 1.0))
 
         st.markdown("Refreshes every second for simulation...")
-        
-    time.sleep(1)
+
+
+render_sensors()
@@ -1,7 +1,10 @@
+import os
+from typing import Optional
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import time
-from collections import deque
+import numpy as np
 import plotly.graph_objects as go
 import streamlit.components.v1 as components
 import random
@@ -15,55 +18,164 @@ VIB_LIMIT = 4.5
 SOUND_LIMIT = 80
 CURR_LIMIT = 4  # amps
 
+# ------------------- Performance Chart Window -------------------
+CHART_POINTS = 60  # one point per rerun, i.e. about 2 minutes at PUSH_INTERVAL_MS
+
+# ------------------- Backend Endpoints -------------------
+# Compact form of /latest: a list in LATEST_FIELDS order
+LATEST_URL = "http://localhost:5000/latest_compact"
+LATEST_FIELDS = ("ts", "temp", "vibration", "sound", "current", "current_amps")
+# Push channel, opened by each viewer's browser rather than by this process.
+# STREAM_HOST = None uses whichever host the viewer loaded the dashboard from.
+STREAM_HOST = None
+STREAM_PORT = 5000
+STREAM_TRANSPORT = "ws"  # or "sse" for Server-Sent Events
+# Each forwarded reading reruns this script; faster POSTs are coalesced to the newest
+PUSH_INTERVAL_MS = 2000
+
+# ------------------- Digital Twin Markup -------------------
+# Static styling is built once; per-rerun values are passed in through CSS
+# variables so only the short markup below is formatted on each rerun.
+_MACHINE_CSS = """
+<style>
+.twin-ring {
+    position: relative;
+    width: 500px;
+    height: 500px;
+    margin: auto;
+    border-radius: 50%;
+    background: radial-gradient(circle at center, #0a0a0a, #000);
+    box-shadow: 0 0 40px var(--ring), inset 0 0 40px var(--ring);
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    animation: rotateGlow 8s linear infinite;
+}
+.twin-core {
+    width: 300px;
+    height: 300px;
+    border-radius: 20px;
+    background: linear-gradient(145deg, #111, #1a1a1a);
+    box-shadow: 0 0 30px var(--ring);
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    color: var(--perf);
+    font-size: 28px;
+    text-align: center;
+}
+@keyframes rotateGlow {
+  0% { box-shadow: 0 0 20px var(--ring), inset 0 0 20px var(--ring); transform: rotate(0deg); }
+  50% { box-shadow: 0 0 60px var(--ring), inset 0 0 60px var(--ring); }
+  100% { box-shadow: 0 0 20px var(--ring), inset 0 0 20px var(--ring); transform: rotate(360deg); }
+}
+</style>
+"""
+_MACHINE_TEMPLATE = """
+<div class="twin-ring" style="--ring: {ring_color}; --perf: {perf_color};">
+    <div class="twin-core">
+        ⚙️ <b>Performance: {perf:.2f}%</b>
+    </div>
+</div>
+"""
+
+# Browser-side push listener (WebSocket or SSE); returns the last pushed reading (or None)
+_sensor_stream = components.declare_component(
+    "sensor_stream",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "sensor_stream"),
+)
+
 # ------------------- Helper Functions -------------------
-def get_status(value, limit):
+# Severity index = (value > 0.8 * limit) + (value > limit): 0 normal, 1 warning, 2 high
+STATUS_LABELS = ("🟢 Normal", "🟡 Warning", "🔴 High")
+
+# Per-sensor (normal, warning, high) insight messages, indexed like STATUS_LABELS
+TEMP_INSIGHTS = ("",
+                 "🌡 <b>Temperature:</b> Rising — ensure proper ventilation.",
+                 "🌡 <b>Temperature:</b> Too high — check cooling system.")
+SOUND_INSIGHTS = ("",
+                  "🔊 <b>Sound:</b> Noise increasing — possible friction.",
+                  "🔊 <b>Sound:</b> Loud noise — check lubrication or bearings.")
+CURR_INSIGHTS = ("",
+                 "⚡ <b>Current:</b> Current rising — monitor load.",
+                 "⚡ <b>Current:</b> Overload — verify wiring and load.")
+VIB_INSIGHTS = ("",
+                "💥 <b>Vibration:</b> Slight vibration increase detected.",
+                "💥 <b>Vibration:</b> Too high — re-align mounts or tighten fittings.")
+CURR_MISSING_INSIGHT = "⚡ <b>Current:</b> Not available — check sensor or conversion."
+
+def get_severity(value: float, limit: float) -> int:
+    return (value > limit) + (value > 0.8 * limit)
+
+def get_status(value: Optional[float], limit: float) -> str:
     if value is None:
         return "⚪ Unknown"
-    if value > limit:
-        return "🔴 High"
-    elif value > (0.8 * limit):
-        return "🟡 Warning"
-    else:
-        return "🟢 Normal"
-
-def get_ai_suggestion(temp, vib, snd, curr):
-    insights = []
-    if temp > TEMP_LIMIT:
-        insights.append("🌡 <b>Temperature:</b> Too high — check cooling system.")
-    elif temp > 0.8 * TEMP_LIMIT:
-        insights.append("🌡 <b>Temperature:</b> Rising — ensure proper ventilation.")
-
-    if snd > SOUND_LIMIT:
-        insights.append("🔊 <b>Sound:</b> Loud noise — check lubrication or bearings.")
-    elif snd > 0.8 * SOUND_LIMIT:
-        insights.append("🔊 <b>Sound:</b> Noise increasing — possible friction.")
-
-    if curr is not None:
-        if curr > CURR_LIMIT:
-            insights.append("⚡ <b>Current:</b> Overload — verify wiring and load.")
-        elif curr > 0.8 * CURR_LIMIT:
-            insights.append("⚡ <b>Current:</b> Current rising — monitor load.")
-    else:
-        insights.append("⚡ <b>Current:</b> Not available — check sensor or conversion.")
+    return STATUS_LABELS[get_severity(value, limit)]
 
-    if vib > VIB_LIMIT:
-        insights.append("💥 <b>Vibration:</b> Too high — re-align mounts or tighten fittings.")
-    elif vib > 0.8 * VIB_LIMIT:
-        insights.append("💥 <b>Vibration:</b> Slight vibration increase detected.")
+@st.cache_data(max_entries=512, show_spinner=False)
+def _ai_suggestion_cached(t_sev: int, s_sev: int, c_sev: Optional[int], v_sev: int) -> str:
+    insights = [msg for msg in (
+        TEMP_INSIGHTS[t_sev],
+        SOUND_INSIGHTS[s_sev],
+        CURR_INSIGHTS[c_sev] if c_sev is not None else CURR_MISSING_INSIGHT,
+        VIB_INSIGHTS[v_sev],
+    ) if msg]
 
     if not insights:
         insights.append("✅ System stable — all parameters normal.")
 
     return "<br>".join(insights)
 
+def get_ai_suggestion(temp: float, vib: float, snd: float, curr: Optional[float]) -> str:
+    # Key the cache on severity indices so it always agrees with get_status
+    c_sev = None if curr is None else get_severity(curr, CURR_LIMIT)
+    return _ai_suggestion_cached(get_severity(temp, TEMP_LIMIT), get_severity(snd, SOUND_LIMIT),
+                                 c_sev, get_severity(vib, VIB_LIMIT))
+
 # ------------------- Session State for Performance Chart -------------------
-if "time_data" not in st.session_state:
-    st.session_state.time_data = deque(maxlen=60)
-    st.session_state.perf_data = deque(maxlen=60)
+# Fixed-size ring buffers: idx is the next write slot, filled the number of valid points
+if "perf_buf" not in st.session_state:
+    st.session_state.perf_buf = np.empty(CHART_POINTS, dtype=np.float64)
+    st.session_state.time_buf = np.empty(CHART_POINTS, dtype="U8")
+    st.session_state.idx = 0
+    st.session_state.filled = 0
+
+if "perf_fig" not in st.session_state:
+    # Built once per session; later reruns only swap in the new points and color
+    perf_fig = go.Figure()
+    perf_fig.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode='lines+markers',
+        line=dict(width=4),
+        marker=dict(size=8),
+    ))
+    perf_fig.update_layout(
+        title="📈 Machine Performance Over Time",
+        xaxis_title="Time",
+        yaxis_title="Performance (%)",
+        template="plotly_dark",
+        height=400,
+    )
+    st.session_state.perf_fig = perf_fig
+
+# ------------------- HTTP Session (keep-alive across reruns) -------------------
+if "http" not in st.session_state:
+    st.session_state.http = requests.Session()
+    st.session_state.http.headers.update({"Connection": "keep-alive"})
+    st.session_state.http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
 
 # ------------------- Fetch real sensor values -------------------
+# Readings are pushed over the WebSocket; a new frame triggers a rerun.
+# Until the first frame arrives, fall back to a one-off HTTP fetch.
+pushed = _sensor_stream(host=STREAM_HOST, port=STREAM_PORT, transport=STREAM_TRANSPORT,
+                        min_interval_ms=PUSH_INTERVAL_MS, key="sensor_stream", default=None)
+
 try:
-    resp = requests.get("http://localhost:5000/latest", timeout=2.0).json()
+    if pushed:
+        resp = pushed
+    else:
+        resp = dict(zip(LATEST_FIELDS, st.session_state.http.get(LATEST_URL, timeout=2.0).json()))
 
     temp = float(resp.get("temp", 0.0))
     vib  = float(resp.get("vibration", 0.0))
@@ -129,45 +241,7 @@ perf_color = ring_color
 st.markdown("<h1 style='text-align:center; color:#00ffcc;'>🤖 AI-Driven Digital Twin Simulator</h1>", unsafe_allow_html=True)
 
 # ------------------- DIGITAL TWIN ANIMATED BLOCK -------------------
-machine_html = f"""
-<div style="
-    position: relative;
-    width: 500px;
-    height: 500px;
-    margin: auto;
-    border-radius: 50%;
-    background: radial-gradient(circle at center, #0a0a0a, #000);
-    box-shadow: 0 0 40px {ring_color}, inset 0 0 40px {ring_color};
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    animation: rotateGlow 8s linear infinite;
-">
-    <div style="
-        width: 300px;
-        height: 300px;
-        border-radius: 20px;
-        background: linear-gradient(145deg, #111, #1a1a1a);
-        box-shadow: 0 0 30px {ring_color};
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        color: {perf_color};
-        font-size: 28px;
-        text-align: center;
-    ">
-        ⚙️ <b>Performance: {perf:.2f}%</b>
-    </div>
-</div>
-
-<style>
-@keyframes rotateGlow {{
-  0% {{ box-shadow: 0 0 20px {ring_color}, inset 0 0 20px {ring_color}; transform: rotate(0deg); }}
-  50% {{ box-shadow: 0 0 60px {ring_color}, inset 0 0 60px {ring_color}; }}
-  100% {{ box-shadow: 0 0 20px {ring_color}, inset 0 0 20px {ring_color}; transform: rotate(360deg); }}
-}}
-</style>
-"""
+machine_html = _MACHINE_CSS + _MACHINE_TEMPLATE.format(ring_color=ring_color, perf_color=perf_color, perf=perf)
 components.html(machine_html, height=550)
 
 # ------------------- SENSOR METRICS -------------------
@@ -212,29 +286,29 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # ------------------- PERFORMANCE CHART -------------------
-current_time = time.strftime("%H:%M:%S")
-st.session_state.time_data.append(current_time)
-st.session_state.perf_data.append(perf)
-
-fig = go.Figure()
-fig.add_trace(go.Scatter(
-    x=list(st.session_state.time_data),
-    y=list(st.session_state.perf_data),
-    mode='lines+markers',
-    line=dict(width=4, color=ring_color),
-    marker=dict(size=8, color=ring_color),
-))
-
-fig.update_layout(
-    title="📈 Machine Performance Over Time",
-    xaxis_title="Time",
-    yaxis_title="Performance (%)",
-    template="plotly_dark",
-    height=400,
-)
-
-st.plotly_chart(fig, use_container_width=True)
-
-# ------------------- AUTO REFRESH -------------------
-time.sleep(2)
-st.rerun()
+lt = time.localtime()
+current_time = f"{lt.tm_hour:02d}:{lt.tm_min:02d}:{lt.tm_sec:02d}"  # HH:MM:SS without strftime
+idx = st.session_state.idx
+st.session_state.time_buf[idx] = current_time
+st.session_state.perf_buf[idx] = perf
+st.session_state.idx = (idx + 1) % CHART_POINTS
+st.session_state.filled = min(st.session_state.filled + 1, CHART_POINTS)
+
+# Oldest-first view of the window; only rotates once the buffer has wrapped
+if st.session_state.filled < CHART_POINTS:
+    time_window = st.session_state.time_buf[:st.session_state.filled]
+    perf_window = st.session_state.perf_buf[:st.session_state.filled]
+else:
+    time_window = np.roll(st.session_state.time_buf, -st.session_state.idx)
+    perf_window = np.roll(st.session_state.perf_buf, -st.session_state.idx)
+
+# Update the persistent figure in place instead of rebuilding trace + layout
+fig = st.session_state.perf_fig
+with fig.batch_update():
+    trace = fig.data[0]
+    trace.x = time_window
+    trace.y = perf_window
+    trace.line.color = ring_color
+    trace.marker.color = ring_color
+
+st.plotly_chart(fig, use_container_width=True, key="perf_chart")
@@ -4,20 +4,65 @@ FastAPI server for Digital Twin demo.
 Endpoints:
   POST /update   -> receive JSON payload from ESP32: {"temp":..,"vibration":..,"sound":..,"current":..}
   GET  /latest   -> return last received reading (JSON)
+  GET  /latest_compact -> same reading as [ts, temp, vibration, sound, current, current_amps]
+  WS   /ws       -> push every new reading (JSON text frame) to connected dashboards
+  GET  /stream   -> Server-Sent Events feed with one "data:" frame per new reading
   GET  /health   -> simple health check
 """
 
 import time
 import csv
 import os
-from typing import Optional
-from fastapi import FastAPI, Request, HTTPException
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import AsyncIterator, Final, Optional
+import orjson
+from fastapi import FastAPI, Request, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
 
 LOG_CSV = "sensor_log.csv"
+CSV_HEADER = ["ts", "temp", "vibration", "sound", "current", "current_amps"]
+CSV_BATCH_SIZE = 32       # max rows per write
+CSV_FLUSH_INTERVAL = 0.025  # seconds to wait for more rows before flushing a partial batch
+SSE_KEEPALIVE = 15.0      # seconds of silence before an SSE comment frame is sent
+WS_SEND_TIMEOUT = 10.0    # seconds a WebSocket client may stall a frame before it is dropped
 
-app = FastAPI(title="Digital Twin FastAPI")
+# Current sensor conversion (see calculate_current_amps)
+AMPS_PASSTHROUGH_MAX: Final[float] = 50.0  # values at or below this are already amps
+SCALE: Final[float] = 0.04  # used on ESP32 before sending (raw * 0.04)
+ADC_MAX: Final[float] = 4095.0
+VREF: Final[float] = 3.3
+V_ZERO: Final[float] = VREF / 2.0
+SENSITIVITY: Final[float] = 0.185  # typical ACS712 5A variant sensitivity (V/A) — adjust if different
+
+# Request handlers only enqueue log records; a background listener does the I/O
+logger = logging.getLogger("twin")
+# e.g. TWIN_LOG_LEVEL=DEBUG to log every received payload
+logger.setLevel(os.environ.get("TWIN_LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+_log_queue: queue.Queue = queue.Queue()
+logger.addHandler(QueueHandler(_log_queue))
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_stream)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services before serving traffic and flush them on shutdown."""
+    _log_listener.start()
+    csv_task = asyncio.create_task(csv_writer())
+    try:
+        yield
+    finally:
+        await stop_csv_writer(csv_task)
+        # Stopped last so warnings from the CSV flush are still written
+        _log_listener.stop()
+
+app = FastAPI(title="Digital Twin FastAPI", lifespan=lifespan)
 
 # Allow CORS from everywhere for easy testing (adjust in production)
 app.add_middleware(
@@ -37,12 +82,28 @@ latest_data = {
     "ts": None
 }
 
-# Pydantic model for request validation
-class SensorPayload(BaseModel):
-    temp: float
-    vibration: float
-    sound: float
-    current: float  # numeric value that may be an ADC-scaled or already amps
+# latest_data serialized once per update, shared by every push subscriber
+latest_json: Optional[str] = None
+# Bumped on every update; subscribers compare it rather than ts (which can repeat)
+latest_seq = 0
+
+# Set (and replaced) on every update to wake /ws and /stream subscribers
+_update_event = asyncio.Event()
+
+# Rows waiting to be written to LOG_CSV by the background writer
+csv_queue: asyncio.Queue = asyncio.Queue()
+_csv_file = None
+_csv_writer = None
+# Checked once at import instead of stat()-ing LOG_CSV on each write
+_csv_header_written = os.path.exists(LOG_CSV)
+
+def _amps_kernel(curr_raw: float) -> float:
+    """ADC-scaled value -> amps; calculate_current_amps handles the passthrough case first."""
+    # Convert back to an ADC reading and compute approximate amps
+    adc_val = curr_raw / SCALE
+    voltage = (adc_val / ADC_MAX) * VREF
+    amps = (voltage - V_ZERO) / SENSITIVITY
+    return abs(amps)
 
 def calculate_current_amps(curr_raw: float) -> Optional[float]:
     """
@@ -51,99 +112,230 @@ def calculate_current_amps(curr_raw: float) -> Optional[float]:
       - If curr_raw <= 50 treat as already measured amps (or small raw)
       - Else treat it as scaled value: curr_raw = ADC_val * SCALE (SCALE=0.04)
         and convert back to ADC and compute amps assuming ACS712-like sensor.
-    This function is defensive and returns None if conversion fails.
+    curr_raw must already be a float (update_sensor validates it); returns
+    None if the conversion yields NaN.
     """
-    try:
-        if curr_raw is None:
-            return None
-        curr_raw = float(curr_raw)
-        # If value is small, assume it's already amps
-        if curr_raw <= 50:
-            return round(abs(curr_raw), 3)
-        # Else try to convert back to an ADC reading and compute approximate amps
-        SCALE = 0.04  # used on ESP32 before sending (raw * 0.04)
-        adc_val = curr_raw / SCALE
-        adc_max = 4095.0
-        Vref = 3.3
-        voltage = (adc_val / adc_max) * Vref
-        v_zero = Vref / 2.0
-        sensitivity = 0.185  # typical ACS712 5A variant sensitivity (V/A) — adjust if different
-        amps = (voltage - v_zero) / sensitivity
-        amps = abs(amps)
-        if amps != amps:  # NaN check
-            return None
-        return round(amps, 3)
-    except Exception:
+    # If value is small, assume it's already amps
+    if curr_raw <= AMPS_PASSTHROUGH_MAX:
+        return abs(curr_raw)
+    amps = _amps_kernel(curr_raw)
+    if amps != amps:  # NaN check
         return None
+    return amps
 
-def append_csv_row(row: dict):
-    header = ["ts", "temp", "vibration", "sound", "current", "current_amps"]
-    first = not os.path.exists(LOG_CSV)
+def append_csv_rows(rows: list):
+    """Append a batch of rows through one persistent, buffered file handle."""
+    global _csv_file, _csv_writer, _csv_header_written
     try:
-        with open(LOG_CSV, "a", newline="") as f:
-            writer = csv.writer(f)
-            if first:
-                writer.writerow(header)
-            writer.writerow([row.get("ts"), row.get("temp"), row.get("vibration"),
-                             row.get("sound"), row.get("current"), row.get("current_amps")])
+        if _csv_file is None:
+            _csv_file = open(LOG_CSV, "a", newline="", buffering=1 << 16)
+            _csv_writer = csv.writer(_csv_file)
+        if not _csv_header_written:
+            _csv_writer.writerow(CSV_HEADER)
+            _csv_header_written = True
+        # Rows are always built by update_sensor, so every key is present
+        _csv_writer.writerows((row["ts"], row["temp"], row["vibration"],
+                               row["sound"], row["current"], row["current_amps"])
+                              for row in rows)
+        _csv_file.flush()
     except Exception as e:
-        # Do not break the API if logging fails; just print a message
-        print("Warning: failed to append CSV row:", e)
+        # Do not break the API if logging fails; just log a message
+        logger.warning("Failed to append CSV rows: %s", e)
+
+async def csv_writer():
+    """
+    Drain csv_queue in the background so POST handlers never touch the disk.
+    Rows are written once CSV_BATCH_SIZE have queued up, or CSV_FLUSH_INTERVAL
+    after the first row of a batch arrived, whichever comes first.
+    """
+    loop = asyncio.get_running_loop()
+    batch = []
+    try:
+        while True:
+            batch = [await csv_queue.get()]
+            deadline = loop.time() + CSV_FLUSH_INTERVAL
+            while len(batch) < CSV_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(csv_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            append_csv_rows(batch)
+            batch = []
+    except asyncio.CancelledError:
+        # Don't lose a partially collected batch on shutdown
+        if batch:
+            append_csv_rows(batch)
+        raise
+
+async def stop_csv_writer(task: asyncio.Task):
+    """Cancel the writer, write out anything still queued and release the file handle."""
+    global _csv_file
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    pending = []
+    while not csv_queue.empty():
+        pending.append(csv_queue.get_nowait())
+    if pending:
+        append_csv_rows(pending)
+    if _csv_file is not None:
+        _csv_file.close()
+        _csv_file = None
+
+def json_response(content) -> Response:
+    """Serialize content with orjson and return it as-is (skips FastAPI's encoder pass)."""
+    return Response(orjson.dumps(content), media_type="application/json")
+
+def publish_latest():
+    """
+    Serialize the latest reading once and wake every /ws and /stream subscriber.
+    Never waits on subscriber sockets, so a stalled client cannot block /update.
+    """
+    global latest_json, latest_seq, _update_event
+    latest_json = orjson.dumps(latest_data).decode()
+    latest_seq += 1
+    # Waiters hold the old event; a fresh one is used for the next update
+    _update_event.set()
+    _update_event = asyncio.Event()
+
+async def latest_frames(keepalive: Optional[float] = None) -> AsyncIterator[Optional[str]]:
+    """
+    Yield latest_json whenever the reading changes (the current one first).
+    A subscriber that falls behind skips straight to the newest reading.
+    With keepalive set, None is yielded after that many idle seconds.
+    """
+    last_seq = 0
+    while True:
+        event = _update_event
+        if latest_seq != last_seq:
+            last_seq = latest_seq
+            yield latest_json
+            continue
+        try:
+            await asyncio.wait_for(event.wait(), keepalive)
+        except asyncio.TimeoutError:
+            yield None
 
 @app.post("/update")
 async def update_sensor(request: Request):
     """
     Receive sensor POST from ESP32 or other clients.
-    Expects JSON matching SensorPayload.
+    Expects a JSON object with numeric "temp", "vibration", "sound" and
+    "current" fields ("current" may be ADC-scaled or already in amps).
     """
     global latest_data
 
     client_ip = request.client.host if request.client else "unknown"
     try:
-        payload = await request.json()
+        payload = orjson.loads(await request.body())
     except Exception as e:
-        print(f"Bad JSON from {client_ip}: {e}")
+        logger.warning("Bad JSON from %s: %s", client_ip, e)
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
     # Log raw payload for debugging
-    print(f"RECEIVED POST from {client_ip} -> {payload}")
+    logger.debug("RECEIVED POST from %s -> %s", client_ip, payload)
 
-    # Validate using Pydantic model
+    # Validate by extracting the four floats directly (cheaper than a model per request)
     try:
-        validated = SensorPayload(**payload)
-    except Exception as e:
-        print(f"Validation error from {client_ip}: {e}")
+        temp = float(payload["temp"])
+        vibration = float(payload["vibration"])
+        sound = float(payload["sound"])
+        current = float(payload["current"])
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Validation error from %s: %s", client_ip, e)
         raise HTTPException(status_code=422, detail="Payload validation failed")
 
     ts = time.time()
-    current_amps = calculate_current_amps(validated.current)
+    current_amps = calculate_current_amps(current)
 
     latest_data = {
-        "temp": round(float(validated.temp), 3),
-        "vibration": round(float(validated.vibration), 3),
-        "sound": round(float(validated.sound), 3),
-        "current": round(float(validated.current), 3),
+        "temp": temp,
+        "vibration": vibration,
+        "sound": sound,
+        "current": current,
         "current_amps": current_amps,
         "ts": ts
     }
 
-    # Append to CSV (best-effort)
-    append_csv_row(latest_data)
+    # Queue for the background CSV writer (best-effort)
+    csv_queue.put_nowait(latest_data)
 
-    return {"status": "ok", "received_at": ts}
+    # Wake live dashboards
+    publish_latest()
+
+    return json_response({"status": "ok", "received_at": ts})
 
 @app.get("/latest")
 async def get_latest():
     """Return the latest reading as JSON. If none seen yet, returns 204 No Content."""
     if latest_data["ts"] is None:
-        return {}  # or you can raise HTTPException(status_code=204)
-    return latest_data
+        return json_response({})  # or you can raise HTTPException(status_code=204)
+    # Already serialized once by publish_latest
+    return Response(latest_json, media_type="application/json")
+
+@app.get("/latest_compact")
+async def get_latest_compact():
+    """Return the latest reading as a fixed-order list (CSV_HEADER order), or [] if none seen yet."""
+    d = latest_data
+    if d["ts"] is None:
+        return json_response([])
+    return json_response([d["ts"], d["temp"], d["vibration"], d["sound"], d["current"], d["current_amps"]])
+
+@app.websocket("/ws")
+async def sensor_stream(websocket: WebSocket):
+    """Subscribe to pushed readings. The current reading (if any) is sent on connect."""
+    await websocket.accept()
+
+    async def push():
+        async for frame in latest_frames():
+            await asyncio.wait_for(websocket.send_text(frame), WS_SEND_TIMEOUT)
+
+    async def drain():
+        # Client messages are ignored; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+
+    tasks = {asyncio.create_task(push()), asyncio.create_task(drain())}
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    if any(isinstance(r, asyncio.TimeoutError) for r in results):
+        logger.warning("Dropping WebSocket client that stopped reading")
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+@app.get("/stream")
+async def stream_latest():
+    """Server-Sent Events feed. The current reading (if any) is sent first, then one frame per update."""
+    async def events():
+        async for frame in latest_frames(SSE_KEEPALIVE):
+            if frame is None:
+                # Comment frame keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {frame}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
 @app.get("/health")
 async def health():
-    return {"status": "running", "ts": time.time()}
+    return json_response({"status": "running", "ts": time.time()})
 
 if __name__ == "__main__":
     import uvicorn
     print("Starting uvicorn server on 0.0.0.0:5000")
-    uvicorn.run("server:app", host="0.0.0.0", port=5000, reload=True)
+    # uvloop + httptools for request throughput; single worker because
+    # latest_data, the WebSocket clients and the CSV queue live in-process
+    uvicorn.run("server:app", host="0.0.0.0", port=5000, reload=False,
+                loop="uvloop", http="httptools")